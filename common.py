@@ -1,12 +1,15 @@
 from abc import ABC, abstractproperty, abstractstaticmethod
-from functools import lru_cache
-from time import sleep
-from typing import Any, Dict, Generic, List, Optional, Tuple, TypeVar, cast
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
+from time import monotonic
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar, cast
 
-import base64
+import asyncio
+import binascii
 import datetime
 import hashlib
 import logging
+import sys
 
 import docker
 import docker.models.services as docker_services
@@ -33,10 +36,49 @@ SECRET_DHPARAM_BASE = f"{NAMESPACE}.dhparam"
 CONFIG_CHALLENGE_BASE = f"{NAMESPACE}.challange"
 CONFIG_CONFIG_BASE = f"{NAMESPACE}.config"
 
+# Certs are renewed once they are within this window of expiring.
+CERT_RENEW_WINDOW = datetime.timedelta(days=7)
+
+# Interned once so the label lookups in every reconcile pass hash
+# pre-interned keys rather than fresh literals.
+LABEL_HOST = sys.intern("nginx-ingress.host")
+LABEL_PORT = sys.intern("nginx-ingress.port")
+LABEL_PATH = sys.intern("nginx-ingress.path")
+LABEL_SSL = sys.intern("nginx-ingress.ssl")
+LABEL_SSL_REDIRECT = sys.intern("nginx-ingress.ssl-redirect")
+LABEL_PROXY_PROTOCOL = sys.intern("nginx-ingress.proxy-protocol")
+
 logger = logging.getLogger(__name__)
 
+# One thread pool drives all Docker API I/O for the process; several
+# DockerAdapter instances may coexist (e.g. Robot and RoboCert) and should
+# share the same bounded set of workers rather than multiplying them.
+_docker_executor = ThreadPoolExecutor(max_workers=8)
+
+
+def decode_spec_data(model: Any) -> str:
+    # Secrets and configs both carry their payload base64-encoded in
+    # Spec.Data; decode in one place so callers cache the decoded string.
+    # a2b_base64 is the C path b64decode wraps; encoding to ascii ourselves
+    # skips b64decode's extra str handling and intermediate allocation.
+    data = model.attrs["Spec"]["Data"]
+    if isinstance(data, str):
+        data = data.encode("ascii")
+    return binascii.a2b_base64(data).decode("utf-8")
+
+
+@lru_cache(maxsize=1)
+def docker_client() -> docker.DockerClient:
+    # One long-lived client per process; sized so the connection pool keeps up
+    # with the executor instead of re-opening sockets per call.
+    return docker.from_env(max_pool_size=32)
+
 
 class DockerAdapter:
+    # How long a service listing stays fresh; amortizes one Docker API
+    # round-trip over the many property reads of a reconcile pass.
+    SERVICES_CACHE_TTL = 2.0
+
     client: docker.DockerClient
 
     svc_account: "IngressService[ConfigServiceAccount]"
@@ -46,17 +88,63 @@ class DockerAdapter:
 
     def __init__(self, client: docker.DockerClient) -> None:
         self.client = client
+        self._executor = _docker_executor
+        self._services_cache: Optional[Tuple[float, List["ServiceAdapter"]]] = None
+        self._secrets_index_cache: Optional[Tuple[float, Dict[str, List]]] = None
+        self._configs_index_cache: Optional[Tuple[float, Dict[str, List]]] = None
 
         self.svc_account = IngressService(self, self.config.services.account)
         self.svc_challenge = IngressService(self, self.config.services.challenge)
         self.svc_nginx = IngressService(self, self.config.services.nginx)
         self.svc_robot = IngressService(self, self.config.services.robot)
 
+    async def _run_async(self, func: Callable, *args: Any) -> Any:
+        # docker-py is synchronous; dispatch to a bounded thread pool so async
+        # callers don't block the event loop on Docker socket round-trips.
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, func, *args
+        )
+
+    @staticmethod
+    def _index_by_prefix(models) -> Dict[str, List]:
+        # Group versioned names ("<prefix>.<version>") by their prefix so one
+        # full listing serves every VersionedSecrets/VersionedConfigs lookup.
+        index: Dict[str, List] = {}
+        for model in models:
+            prefix = model.name.rsplit(".", 1)[0] + "."
+            index.setdefault(prefix, []).append(model)
+        return index
+
+    def secrets_index(self) -> Dict[str, List]:
+        cached = self._secrets_index_cache
+        now = monotonic()
+        if cached is not None and now - cached[0] < self.SERVICES_CACHE_TTL:
+            return cached[1]
+
+        index = self._index_by_prefix(self.client.secrets.list())
+        self._secrets_index_cache = (now, index)
+        return index
+
+    def configs_index(self) -> Dict[str, List]:
+        cached = self._configs_index_cache
+        now = monotonic()
+        if cached is not None and now - cached[0] < self.SERVICES_CACHE_TTL:
+            return cached[1]
+
+        index = self._index_by_prefix(self.client.configs.list())
+        self._configs_index_cache = (now, index)
+        return index
+
     def list_secrets(self, prefix: Optional[str] = None):
-        secrets = self.client.secrets.list()
-        if prefix is not None:
-            secrets = [secret for secret in secrets if secret.name.startswith(prefix)]
-        return secrets
+        if prefix is None:
+            return self.client.secrets.list()
+        # The name filter is a substring match server-side; keep the exact
+        # prefix check here.
+        secrets = self.client.secrets.list(filters=dict(name=prefix))
+        return [secret for secret in secrets if secret.name.startswith(prefix)]
+
+    async def alist_secrets(self, prefix: Optional[str] = None):
+        return await self._run_async(self.list_secrets, prefix)
 
     def secret_exists(self, secret_name: str) -> Optional[str]:
         try:
@@ -64,18 +152,32 @@ class DockerAdapter:
         except docker.errors.NotFound:
             return None
 
+    async def asecret_exists(self, secret_name: str) -> Optional[str]:
+        return await self._run_async(self.secret_exists, secret_name)
+
     def secret_reference(
         self, secret_id: str, secret_name: str, target: str
     ) -> docker_types.SecretReference:
         return docker_types.SecretReference(secret_id, secret_name, target, mode=440)
 
+    def secret_references(self, models) -> List[docker_types.SecretReference]:
+        # Purely local: the models already come from the batched secrets
+        # index, and SecretReference construction issues no API calls.
+        return [
+            self.secret_reference(model.id, model.name, model.name) for model in models
+        ]
+
     def read_secret(self, secret_name: str) -> Optional[docker_secrets.Model]:
         try:
             return self.client.secrets.get(secret_name)
         except docker.errors.NotFound:
             return None
 
+    async def aread_secret(self, secret_name: str) -> Optional[docker_secrets.Model]:
+        return await self._run_async(self.read_secret, secret_name)
+
     def del_secret(self, secret_name: str) -> bool:
+        self._secrets_index_cache = None
         try:
             self.client.secrets.get(secret_name).remove()
             return True
@@ -91,10 +193,13 @@ class DockerAdapter:
         return self.client.secrets.create(name=secret_name, data=secret, labels=labels)
 
     def list_configs(self, prefix: Optional[str] = None):
-        configs = self.client.configs.list()
-        if prefix is not None:
-            configs = [config for config in configs if config.name.startswith(prefix)]
-        return configs
+        if prefix is None:
+            return self.client.configs.list()
+        configs = self.client.configs.list(filters=dict(name=prefix))
+        return [config for config in configs if config.name.startswith(prefix)]
+
+    async def alist_configs(self, prefix: Optional[str] = None):
+        return await self._run_async(self.list_configs, prefix)
 
     def config_read(self, config_name: str) -> Optional[docker_configs.Model]:
         try:
@@ -102,7 +207,11 @@ class DockerAdapter:
         except docker.errors.NotFound:
             return None
 
+    async def aconfig_read(self, config_name: str) -> Optional[docker_configs.Model]:
+        return await self._run_async(self.config_read, config_name)
+
     def config_del(self, config_name: str) -> bool:
+        self._configs_index_cache = None
         try:
             self.client.configs.get(config_name).remove()
             return True
@@ -119,25 +228,30 @@ class DockerAdapter:
 
     @property
     def services(self) -> List["ServiceAdapter"]:
-        return [
+        cached = self._services_cache
+        now = monotonic()
+        if cached is not None and now - cached[0] < self.SERVICES_CACHE_TTL:
+            return cached[1]
+
+        services = [
             ServiceAdapter(self, service)
-            for service in self.client.services.list(
-                filters=dict(label="nginx-ingress.host")
-            )
+            for service in self.client.services.list(filters=dict(label=LABEL_HOST))
         ]
+        self._services_cache = (now, services)
+        return services
 
-    @property
-    @lru_cache()
-    def config(self) -> Optional[ConfigRoot]:
+    async def aservices(self) -> List["ServiceAdapter"]:
+        return await self._run_async(lambda: self.services)
+
+    @cached_property
+    def config(self) -> ConfigRoot:
         latest = VersionedConfigs(self, CONFIG_CONFIG_BASE).latest
         if not latest:
             raise Exception(
                 f"Config missing, try adding a docker config called {CONFIG_CONFIG_BASE}.0"
             )
 
-        data = base64.b64decode(latest.attrs["Spec"]["Data"]).decode("utf-8")
-
-        return config_load_and_convert(data)
+        return config_load_and_convert(decode_spec_data(latest))
 
 
 TConfigService = TypeVar("TConfigService", bound=ConfigServiceBase)
@@ -149,15 +263,35 @@ class ServiceAdapterBase(ABC):
     def __init__(self, docker: DockerAdapter) -> None:
         super().__init__()
         self.docker = docker
+        self._secrets_cache: Optional[Tuple[int, Dict[str, str]]] = None
 
     @abstractproperty
     def model(self) -> Optional[docker_services.Model]:
         ...
 
+    @property
+    def secrets(self) -> Dict[str, str]:
+        model = self.model
+        if not model:
+            return {}
 
-class ServiceAdapter(ServiceAdapterBase):
-    LABELS = ("hosts", "port", "path", "acme_ssl", "ssl_redirect")
+        # The nested Spec walk re-hashes the same constant keys each read;
+        # cache per spec version so it runs once until the service changes.
+        version = model.attrs["Version"]["Index"]
+        cached = self._secrets_cache
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        secrets = {}
+        container_spec = model.attrs["Spec"]["TaskTemplate"]["ContainerSpec"]
+        for secret in container_spec.get("Secrets", ()):
+            secrets[secret["File"]["Name"]] = secret["SecretName"]
 
+        self._secrets_cache = (version, secrets)
+        return secrets
+
+
+class ServiceAdapter(ServiceAdapterBase):
     __model: docker_services.Model
 
     def __init__(self, docker: DockerAdapter, model: docker_services.Model) -> None:
@@ -166,8 +300,13 @@ class ServiceAdapter(ServiceAdapterBase):
 
     def __repr__(self) -> str:
         labels = []
-        for label in self.LABELS:
-            value = getattr(self, label)
+        for label, value in (
+            ("hosts", self.hosts),
+            ("port", self.port),
+            ("path", self.path),
+            ("acme_ssl", self.acme_ssl),
+            ("ssl_redirect", self.ssl_redirect),
+        ):
             if value is True:
                 labels.append(label)
             elif value:
@@ -179,7 +318,7 @@ class ServiceAdapter(ServiceAdapterBase):
     def model(self) -> docker_services.Model:
         return self.__model
 
-    @property
+    @cached_property
     def labels(self) -> Dict[str, str]:
         model = self.model
         if not model:
@@ -189,45 +328,45 @@ class ServiceAdapter(ServiceAdapterBase):
             return model.attrs["Spec"]["Labels"]
         return {}
 
-    @property
+    @cached_property
     def hosts(self) -> List[str]:
-        return list(filter(bool, self.labels.get("nginx-ingress.host", "").split(",")))
+        return list(filter(bool, self.labels.get(LABEL_HOST, "").split(",")))
 
-    @property
+    @cached_property
     def port(self) -> int:
-        return int(self.labels.get("nginx-ingress.port", 80))
+        return int(self.labels.get(LABEL_PORT, 80))
 
-    @property
+    @cached_property
     def path(self) -> str:
-        return self.labels.get("nginx-ingress.path", "")
+        return self.labels.get(LABEL_PATH, "")
 
     @property
     def acme_ssl(self) -> bool:
-        return "nginx-ingress.ssl" in self.labels
+        return LABEL_SSL in self.labels
 
     @property
     def ssl_redirect(self) -> bool:
-        return "nginx-ingress.ssl-redirect" in self.labels
+        return LABEL_SSL_REDIRECT in self.labels
 
     @property
     def proxy_protocol(self) -> Optional[str]:
-        return self.labels.get("nginx-ingress.proxy-protocol")
+        return self.labels.get(LABEL_PROXY_PROTOCOL)
 
-    @property
+    @cached_property
     def keys(self) -> "VersionedSecrets":
         model = self.model
         if not model:
             raise ReferenceError(f"Service {self.model.name} does not exist")
         return VersionedSecrets(self.docker, f"{SECRET_SVC_BASE}.{model.id}.key.")
 
-    @property
+    @cached_property
     def certs(self) -> "VersionedSecrets":
         model = self.model
         if not model:
             raise ReferenceError(f"Service {self.model.name} does not exist")
         return VersionedSecrets(self.docker, f"{SECRET_SVC_BASE}.{model.id}.crt.")
 
-    @property
+    @cached_property
     def latest_cert_pair_with_version(
         self
     ) -> Optional[Tuple[docker_secrets.Model, docker_secrets.Model, int]]:
@@ -254,32 +393,28 @@ class ServiceAdapter(ServiceAdapterBase):
             return None
         return latest[2]
 
-    @property
-    def cert_renewable(self) -> bool:
+    @cached_property
+    def cert_expiry(self) -> Optional[datetime.datetime]:
+        # Expiry is carried in the cert secret's labels, so this costs a dict
+        # read rather than an X.509 parse; cached with the pair lookup.
         latest_cert_pair = self.latest_cert_pair
         if not latest_cert_pair:
-            return False
+            return None
         cert = latest_cert_pair[1]
 
         secret_expiry_unix = float(cert.attrs["Spec"]["Labels"]["expires"])
-        secret_expiry = datetime.datetime.utcfromtimestamp(secret_expiry_unix)
-
-        if secret_expiry < datetime.datetime.now() + datetime.timedelta(days=7):
-            return True
-
-        return False
+        return datetime.datetime.fromtimestamp(
+            secret_expiry_unix, tz=datetime.timezone.utc
+        )
 
     @property
-    def secrets(self) -> Dict[str, str]:
-        secrets = {}
-        model = self.model
-        if not model:
-            return secrets
+    def cert_renewable(self) -> bool:
+        cert_expiry = self.cert_expiry
+        if cert_expiry is None:
+            return False
 
-        for secret in model.attrs["Spec"]["TaskTemplate"]["ContainerSpec"]["Secrets"]:
-            secrets[secret["File"]["Name"]] = secret["SecretName"]
-
-        return secrets
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        return cert_expiry < now + CERT_RENEW_WINDOW
 
 
 class IngressService(ServiceAdapterBase, Generic[TConfigService]):
@@ -288,12 +423,24 @@ class IngressService(ServiceAdapterBase, Generic[TConfigService]):
     def __init__(self, docker: DockerAdapter, config: TConfigService) -> None:
         super().__init__(docker)
         self.config = config
+        self._model: Optional[docker_services.Model] = None
 
     def __repr__(self) -> str:
         return f"<IngressService: {repr(self.model)}>"
 
     @property
     def model(self) -> Optional[docker_services.Model]:
+        # Cached after the first lookup; ensure() refreshes it, callers that
+        # mutate the service out of band should call refresh() themselves.
+        if self._model is None:
+            self._model = self._fetch_model()
+        return self._model
+
+    def refresh(self) -> Optional[docker_services.Model]:
+        self._model = self._fetch_model()
+        return self._model
+
+    def _fetch_model(self) -> Optional[docker_services.Model]:
         try:
             return self.docker.client.services.get(self.config.name)
         except docker.errors.NotFound:
@@ -306,7 +453,7 @@ class IngressService(ServiceAdapterBase, Generic[TConfigService]):
         secrets: Optional[List[SecretReference]] = None,
         mounts: Optional[List[str]] = None,
     ) -> docker_services.Model:
-        model = self.model
+        model = self.refresh()
         config = self.config
 
         kwargs = {}
@@ -349,12 +496,12 @@ class IngressService(ServiceAdapterBase, Generic[TConfigService]):
                 **kwargs,
             )
 
+        self._model = model
         return model
 
     def wait_for_state(self, state_desired: str, states_invalid: List[str]) -> bool:
         logger.info("Waiting for %s state %s", self.config.name, state_desired)
         while True:
-            sleep(5)
             tasks = self.model.tasks()
             states = set()
 
@@ -377,10 +524,31 @@ class IngressService(ServiceAdapterBase, Generic[TConfigService]):
                 logger.info("States converged to %s", state_desired)
                 return True
 
+            self._wait_for_task_event()
+
+    def _wait_for_task_event(self) -> None:
+        # Block on the events stream until one of the service's containers
+        # changes state, rather than sleeping a fixed interval. The `until`
+        # bound re-checks periodically in case an event raced past between
+        # the state check and subscribing.
+        events = self.docker.client.events(
+            decode=True,
+            until=datetime.datetime.utcnow() + datetime.timedelta(seconds=5),
+            filters=dict(
+                type="container",
+                label=f"com.docker.swarm.service.name={self.config.name}",
+            ),
+        )
+        try:
+            next(events, None)
+        finally:
+            events.close()
+
 
 class SecretContainer:
     def __init__(self, config: str, metadata: Optional[Dict[str, Any]]) -> None:
         self.config = config
+        self.config_bytes = config.encode("utf-8")
         self.metadata = metadata or {}
 
     def __str__(self) -> str:
@@ -389,9 +557,11 @@ class SecretContainer:
     def __repr__(self) -> str:
         return f"<SecretContainer: {self.hash}>"
 
-    @property
+    @cached_property
     def hash(self) -> str:
-        return hashlib.sha1(self.config.encode("utf-8")).hexdigest()
+        # Only a cache key for secret names, not cryptographic; blake2b is
+        # faster than sha1 and the digest is computed once per container.
+        return hashlib.blake2b(self.config_bytes, digest_size=20).hexdigest()
 
 
 T = TypeVar("T")
@@ -413,10 +583,13 @@ class VersionedBase(ABC, Generic[T]):
     def get_name(config: T) -> str:
         ...
 
-    @property
+    @cached_property
     def versions(self) -> Dict[int, T]:
+        # rpartition avoids allocating a list of every name component just to
+        # take the tail.
         return {
-            int(self.get_name(config).split(".")[-1]): config for config in self.list
+            int(self.get_name(config).rpartition(".")[2]): config
+            for config in self.list
         }
 
     @property
@@ -452,7 +625,7 @@ class VersionedBase(ABC, Generic[T]):
 class VersionedSecrets(VersionedBase[docker_secrets.Model]):
     @property
     def list(self) -> List[docker_secrets.Model]:
-        return self.docker.list_secrets(self.prefix)
+        return self.docker.secrets_index().get(self.prefix, [])
 
     @staticmethod
     def get_name(config: docker_secrets.Model) -> str:
@@ -462,7 +635,7 @@ class VersionedSecrets(VersionedBase[docker_secrets.Model]):
 class VersionedConfigs(VersionedBase[docker_configs.Model]):
     @property
     def list(self) -> List[docker_configs.Model]:
-        return self.docker.list_configs(self.prefix)
+        return self.docker.configs_index().get(self.prefix, [])
 
     @staticmethod
     def get_name(config: docker_configs.Model) -> str:
@@ -1,7 +1,7 @@
 from typing import Dict, List, Optional, Tuple
 
 from enum import Enum
-import re
+from functools import cached_property, lru_cache
 import sys
 
 from docker.types.services import EndpointSpec
@@ -9,7 +9,12 @@ from pydantic import BaseModel, validator
 from pydantic.class_validators import root_validator
 import yaml
 
-RE_EMAIL = re.compile(r"^.+@.+$")
+try:
+    # libyaml parses roughly an order of magnitude faster than the
+    # pure-Python loader; fall back when PyYAML was built without it.
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader  # type: ignore[assignment]
 
 
 class PortPublishMode(str, Enum):
@@ -26,10 +31,14 @@ class ServiceMode(str, Enum):
 class ConfigAcme(BaseModel):
     email: str
     accept_tos: bool
+    # Cap on in-flight cert orders so a large swarm stays within the CA's
+    # per-account rate limits.
+    max_concurrent_orders: int = 10
 
     @validator("email")
     def email_valid(cls, v: str):
-        if not RE_EMAIL.match(v):
+        # Equivalent to the old ^.+@.+$ regex without the regex engine.
+        if "@" not in v[1:-1]:
             raise ValueError("Invalid email address")
         return v
 
@@ -39,6 +48,12 @@ class ConfigAcme(BaseModel):
             raise ValueError("You must accept the Let's Encrypt Terms Of Service")
         return v
 
+    @validator("max_concurrent_orders")
+    def max_concurrent_orders_valid(cls, v: int):
+        if v < 1:
+            raise ValueError("max_concurrent_orders must be at least 1")
+        return v
+
 
 class ConfigPorts(BaseModel):
     http: int = 80
@@ -94,8 +109,13 @@ class ConfigServiceNginx(ConfigServiceBase):
     maxreplicas: Optional[int] = 1
     networks: List[str] = []
 
-    @property
+    class Config:
+        keep_untouched = (cached_property,)
+
+    @cached_property
     def endpoint_spec(self) -> Optional[EndpointSpec]:
+        # The config is immutable once loaded; build the spec once instead of
+        # per ensure cycle.
         if self.attach_to_host_network:
             return None
         if self.port_mode == PortPublishMode.none:
@@ -121,11 +141,9 @@ class ConfigServices(BaseModel):
 
     @root_validator
     def names_valid(cls, values):
-        names_seen = set()
-        for value in values.values():
-            if value.name in names_seen:
-                raise ValueError(f"Duplicate service name {value.name}")
-            names_seen.add(value.name)
+        names = [value.name for value in values.values()]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate service names in {sorted(names)}")
         return values
 
 
@@ -134,8 +152,12 @@ class ConfigRoot(BaseModel):
     services: ConfigServices = ConfigServices()
 
 
+@lru_cache(maxsize=4)
 def config_load_and_convert(data: str) -> ConfigRoot:
-    return ConfigRoot(**yaml.load(data, Loader=yaml.SafeLoader))
+    # Full pydantic validation runs once per distinct document; several
+    # DockerAdapter instances can coexist in a process and all read the same
+    # config. The returned model is shared, treat it as read-only.
+    return ConfigRoot(**yaml.load(data, Loader=YamlSafeLoader))
 
 
 def main(argv):
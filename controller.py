@@ -1,14 +1,16 @@
 import datetime
 import subprocess
-from typing import List, Optional, Tuple
+import threading
+from functools import cached_property
+from typing import Any, List, Optional, Tuple
 
 import logging
-from time import sleep, mktime
+from time import sleep
 import sys
 
 import docker
 import docker.models.services as docker_services
-from jinja2 import Template
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
 
 from common import (
     SECRET_DHPARAM_BASE,
@@ -17,6 +19,7 @@ from common import (
     SECRET_NGINX_CONF,
     SECRET_ACME_ACCOUNT,
     VersionedSecrets,
+    docker_client,
 )
 
 logging.basicConfig()
@@ -24,7 +27,15 @@ logging.root.setLevel(logging.INFO)
 logger = logging.getLogger("controller")
 logger.setLevel(logging.DEBUG)
 
-adapter = DockerAdapter(docker.from_env())
+# Compile the template once per process; auto_reload off since the file is
+# baked into the image, and the bytecode cache spares recompilation across
+# container restarts sharing /tmp.
+_template_env = Environment(
+    loader=FileSystemLoader("."),
+    auto_reload=False,
+    bytecode_cache=FileSystemBytecodeCache(),
+)
+_nginx_template = _template_env.get_template("nginx.conf.jinja")
 
 
 class Controller:
@@ -32,14 +43,20 @@ class Controller:
     config_template: Template
 
     def __init__(self) -> None:
-        self.adapter = DockerAdapter(docker.from_env())
-        with open("nginx.conf.jinja") as template:
-            self.config_template = Template(template.read())
+        self.adapter = DockerAdapter(docker_client())
+        self.config_template = _nginx_template
+        self._last_fingerprint: Optional[Tuple[Any, ...]] = None
+        self._last_config: Optional[Tuple[str, str, SecretContainer]] = None
+        self._dhparams_thread: Optional[threading.Thread] = None
 
     @property
     def nginx_service_config(self) -> Optional[str]:
         return self.adapter.svc_nginx.secrets.get("/etc/nginx/nginx.conf")
 
+    @property
+    def nginx_service_dhparams(self) -> Optional[str]:
+        return self.adapter.svc_nginx.secrets.get("/etc/nginx/ssl-dhparams.pem")
+
     @property
     def nginx_config(self) -> SecretContainer:
         services = self.adapter.services
@@ -51,49 +68,93 @@ class Controller:
                 proxy_protocol=proxy_protocol,
                 config=self.adapter.config,
             ),
-            metadata=dict(cert_pairs=map(lambda s: s.latest_cert_pair, services)),
+            metadata=dict(
+                cert_pairs=tuple(service.latest_cert_pair for service in services)
+            ),
+        )
+
+    @staticmethod
+    def services_fingerprint(services) -> Tuple[Any, ...]:
+        # Cheap identity of the rendered config inputs: service spec versions
+        # and the cert pair secrets each one resolves to.
+        return tuple(
+            (
+                service.model.id,
+                service.model.attrs["Version"]["Index"],
+                tuple(model.id for model in service.latest_cert_pair or ()),
+            )
+            for service in services
         )
 
     def ensure_nginx_config(self) -> Tuple[str, str, SecretContainer]:
+        fingerprint = self.services_fingerprint(self.adapter.services)
+        if fingerprint == self._last_fingerprint and self._last_config:
+            # Nothing feeding the template changed; skip the render and hash,
+            # just check the secret is still there.
+            config_secret_name = self._last_config[0]
+            if self.adapter.secret_exists(config_secret_name):
+                logger.debug(
+                    "Nginx config inputs unchanged, reusing %s", config_secret_name
+                )
+                return self._last_config
+
         config = self.nginx_config
-        config_hash = config.hash
-        config_secret_name = f"{SECRET_NGINX_CONF}.{config_hash}"
+        config_secret_name = f"{SECRET_NGINX_CONF}.{config.hash}"
         secret_id = self.adapter.secret_exists(config_secret_name)
         if not secret_id:
             logger.info(f"Secret {config_secret_name} not found, writing")
             secret_id = self.adapter.write_secret(config_secret_name, str(config)).id
-        return (config_hash, secret_id, config)
+
+        self._last_fingerprint = fingerprint
+        self._last_config = (config_secret_name, secret_id, config)
+        return self._last_config
 
     def ensure_nginx_service(self) -> None:
         logger.info("Ensure nginx service")
-        config_hash, config_secret_id, config = self.ensure_nginx_config()
-        config_secret_name = f"{SECRET_NGINX_CONF}.{config_hash}"
+        config_secret_name, config_secret_id, config = self.ensure_nginx_config()
+
+        _, dhparams_secret = self.dhparams_vs.latest_version or (None, None)
+        assert dhparams_secret, "dhparams secret missing"
+
+        # Steady state: the running service already mounts this exact config
+        # and the latest dhparams, and isn't mid-update, so skip the
+        # secret-ref build and update call. The dhparams check matters
+        # because a background rotation changes neither the rendered config
+        # nor its hash.
+        model = self.adapter.svc_nginx.refresh()
+        if (
+            model is not None
+            and self.nginx_service_config == config_secret_name
+            and self.nginx_service_dhparams == dhparams_secret.name
+        ):
+            update_state = model.attrs.get("UpdateStatus", {}).get("State", "completed")
+            if update_state == "completed":
+                logger.debug(
+                    "Nginx service already mounts %s, nothing to do", config_secret_name
+                )
+                return
 
         config_secret_ref = self.adapter.secret_reference(
             config_secret_id, config_secret_name, "/etc/nginx/nginx.conf"
         )
 
-        _, dhparams_secret = self.dhparams_vs.latest_version or (None, None)
-        assert dhparams_secret, "dhparams secret missing"
         dhparams_secret_ref = self.adapter.secret_reference(
             dhparams_secret.id, dhparams_secret.name, "/etc/nginx/ssl-dhparams.pem"
         )
 
-        cert_pair_secret_refs = []
-        for cert_pair in config.metadata["cert_pairs"]:
-            if not cert_pair:
-                continue
-            for model in cert_pair:
-                cert_pair_secret_refs.append(
-                    self.adapter.secret_reference(model.id, model.name, model.name)
-                )
+        cert_pair_secret_refs = self.adapter.secret_references(
+            model
+            for cert_pair in config.metadata["cert_pairs"]
+            if cert_pair
+            for model in cert_pair
+        )
 
         self.adapter.svc_nginx.ensure(
             networks=["nginx-docker-ingress"] + self.adapter.svc_nginx.config.networks,
             secrets=[config_secret_ref, dhparams_secret_ref] + cert_pair_secret_refs,
         )
 
-        self.adapter.svc_nginx.wait_for_state("running", "failed")
+        self.adapter.svc_nginx.wait_for_state("running", ["failed"])
 
     @property
     def account_service(self) -> Optional[docker_services.Model]:
@@ -118,7 +179,7 @@ class Controller:
             mounts=["/var/run/docker.sock:/var/run/docker.sock:rw"],
         )
 
-        self.adapter.svc_account.wait_for_state("complete", "failed")
+        self.adapter.svc_account.wait_for_state("complete", ["failed"])
 
         self.adapter.svc_account.model.remove()
 
@@ -145,48 +206,75 @@ class Controller:
             secrets=[account_secret_ref],
         )
 
-    @property
-    def dhparams_vs(self):
+    @cached_property
+    def dhparams_vs(self) -> VersionedSecrets:
         return VersionedSecrets(self.adapter, f"{SECRET_DHPARAM_BASE}.")
 
     def ensure_dhparams(self):
-        logger.info("Ensuring dhparams is fresh")
+        logger.debug("Ensuring dhparams is fresh")
+        if self._dhparams_thread is not None:
+            if self._dhparams_thread.is_alive():
+                return
+            self._dhparams_thread = None
+
         vs = self.dhparams_vs
 
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+
         version, model = vs.latest_version or (None, None)
-        logger.info("%r %r", version, model)
+        logger.debug("Latest dhparams %r %r", version, model)
         if version is not None and model is not None:
-            logger.info("Have dhparams secret, checking...")
             next_version = version + 1
             secret_expiry_unix = float(model.attrs["Spec"]["Labels"]["expires"])
-            secret_expiry = datetime.datetime.utcfromtimestamp(secret_expiry_unix)
-            logger.info(
-                "%r %r",
+            secret_expiry = datetime.datetime.fromtimestamp(
+                secret_expiry_unix, tz=datetime.timezone.utc
+            )
+            logger.debug(
+                "Dhparams expires %r, renewal threshold %r",
                 secret_expiry,
-                datetime.datetime.now() + datetime.timedelta(days=7),
+                now + datetime.timedelta(days=7),
             )
-            if secret_expiry > datetime.datetime.now() + datetime.timedelta(days=7):
-                logger.info("Dhparams is fresh enough")
+            if secret_expiry > now + datetime.timedelta(days=7):
+                logger.debug("Dhparams is fresh enough")
                 return
         else:
             next_version = 0
 
         secret_name = vs.with_version(next_version)
-        secert_expiry = datetime.datetime.utcnow() + datetime.timedelta(days=28)
-        secert_expiry_unix = mktime(secert_expiry.timetuple())
+        secret_expiry_unix = (now + datetime.timedelta(days=28)).timestamp()
+
+        if version is None:
+            # First boot: nginx cannot come up without dhparams, so block.
+            self._generate_dhparams(secret_name, secret_expiry_unix)
+        else:
+            # Renewal: generating 4096-bit dhparams takes minutes; do it in
+            # the background so the reconcile loop keeps running against the
+            # still-valid previous secret.
+            self._dhparams_thread = threading.Thread(
+                target=self._generate_dhparams,
+                args=(secret_name, secret_expiry_unix),
+                daemon=True,
+            )
+            self._dhparams_thread.start()
 
+    def _generate_dhparams(self, secret_name: str, expires_unix: float) -> None:
         logger.info("Generating new dhparams")
-        subprocess.run(
-            ["openssl", "dhparam", "-out", "/tmp/ssl-dhparams.pem", "4096"],
-            stdout=subprocess.DEVNULL,
+        # Capture the PEM from stdout; no tmp file, no residue on disk.
+        proc = subprocess.run(
+            ["openssl", "dhparam", "4096"],
+            stdout=subprocess.PIPE,
             stderr=subprocess.DEVNULL,
-        ).check_returncode()
+        )
+        proc.check_returncode()
 
         logger.info("Storing dhparams")
-        with open("/tmp/ssl-dhparams.pem") as f:
-            self.adapter.write_secret(
-                secret_name, f.read(), dict(expires=str(secert_expiry_unix))
-            )
+        self.adapter.write_secret(
+            secret_name, proc.stdout.decode("ascii"), dict(expires=str(expires_unix))
+        )
+
+        # The cached VersionedSecrets memoizes its versions; rebuild it so the
+        # new dhparam is picked up.
+        self.__dict__.pop("dhparams_vs", None)
 
     def ensure_challenge(self):
         logger.info("Ensure challenge handler")
@@ -212,6 +300,7 @@ def main(argv: List[str]) -> int:
     controller.ensure_challenge()
 
     while True:
+        controller.ensure_dhparams()
         controller.ensure_nginx_service()
         sleep(10)
 
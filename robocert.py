@@ -1,14 +1,17 @@
-from typing import Dict, List, cast
+from typing import List, Optional
 
+import asyncio
 import datetime
 import logging
-import time
+from functools import lru_cache
 
 from acme import crypto_util
-import OpenSSL
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
 
 from acmeasync.acmele import ACMELE, Challenge
-import docker
+from aiohttp_requests import requests as _acme_http
 
 from common import (
     CONFIG_CHALLENGE_BASE,
@@ -16,6 +19,7 @@ from common import (
     DockerAdapter,
     SECRET_ACME_ACCOUNT,
     ServiceAdapter,
+    docker_client,
 )
 
 logger = logging.getLogger(__name__)
@@ -24,14 +28,33 @@ DIRECTORY_URI = "https://acme-v02.api.letsencrypt.org/directory"
 ACCOUNT_SECRET_PATH = f"/run/secrets/{SECRET_ACME_ACCOUNT}"
 
 
+@lru_cache(maxsize=128)
+def cert_not_after(cert_pem: bytes) -> datetime.datetime:
+    # The ASN.1 decode is the expensive part; memoize per PEM so retries and
+    # recomputations over the same certificate are free.
+    cert = x509.load_pem_x509_certificate(cert_pem)
+    try:
+        return cert.not_valid_after_utc
+    except AttributeError:  # cryptography < 42
+        return cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+
+
 class RoboCert:
-    def __init__(self) -> None:
-        self.adapter = DockerAdapter(docker.from_env())
+    def __init__(self, adapter: Optional[DockerAdapter] = None) -> None:
+        self.adapter = (
+            adapter if adapter is not None else DockerAdapter(docker_client())
+        )
         self.acme = ACMELE(DIRECTORY_URI)
 
     async def begin(self) -> None:
         await self.acme.begin()
 
+    def close(self) -> None:
+        # acmeasync routes every ACME call through the aiohttp_requests
+        # module singleton, so all orders already share one keep-alive
+        # ClientSession; close it so shutdown doesn't leak the connector.
+        _acme_http.close()
+
     async def load_account(self) -> bool:
         return await self.acme.loadAccount(ACCOUNT_SECRET_PATH)
 
@@ -56,15 +79,24 @@ class RoboCert:
             logger.critical("Failed to create order")
             return False
 
-        challs: List[Challenge] = []
-        for auth in await order.authorizations():
-            for chall in await auth.challenges("http-01"):
-                token = chall.data["token"]
-                self.adapter.config_write(
-                    f"{CONFIG_CHALLENGE_BASE}.{token}",
-                    f"{token}.{self.acme.account_key_thumbprint}",
-                )
-                challs.append(await chall.begin())
+        # Each authorization is an independent round-trip to the CA; overlap
+        # them instead of awaiting one by one.
+        auths = await order.authorizations()
+        chall_lists = await asyncio.gather(
+            *(auth.challenges("http-01") for auth in auths)
+        )
+        selected = [chall for chall_list in chall_lists for chall in chall_list]
+
+        for chall in selected:
+            token = chall.data["token"]
+            self.adapter.config_write(
+                f"{CONFIG_CHALLENGE_BASE}.{token}",
+                f"{token}.{self.acme.account_key_thumbprint}",
+            )
+
+        challs: List[Challenge] = await asyncio.gather(
+            *(chall.begin() for chall in selected)
+        )
 
         if not challs:
             logger.exception("No http-01 challenges")
@@ -72,8 +104,7 @@ class RoboCert:
 
         logger.info("Awaiting challenges")
 
-        for chall in challs:
-            await chall.await_status("valid")
+        await asyncio.gather(*(chall.await_status("valid") for chall in challs))
 
         for chall in challs:
             # FIXME: Clean up challenges
@@ -89,10 +120,11 @@ class RoboCert:
             )
             return False
 
-        pkey = OpenSSL.crypto.PKey()
-        pkey.generate_key(OpenSSL.crypto.TYPE_RSA, 2048)
-        key_pem = cast(
-            bytes, OpenSSL.crypto.dump_privatekey(OpenSSL.crypto.FILETYPE_PEM, pkey)
+        pkey = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        key_pem = pkey.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption(),
         )
 
         csr_pem = crypto_util.make_csr(key_pem, service.hosts)
@@ -109,14 +141,7 @@ class RoboCert:
 
         cert_pem = await order.get_cert()
 
-        cert_obj = OpenSSL.crypto.load_certificate(
-            OpenSSL.crypto.FILETYPE_PEM, cert_pem.encode("utf-8")
-        )
-
-        cert_expiry = datetime.datetime.strptime(
-            cert_obj.get_notAfter().decode("ascii"), "%Y%m%d%H%M%SZ"
-        )
-        cert_expiry_unix = time.mktime(cert_expiry.timetuple())
+        cert_expiry_unix = cert_not_after(cert_pem.encode("utf-8")).timestamp()
 
         logger.info("Writing secrets")
 
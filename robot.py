@@ -1,12 +1,14 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 import asyncio
+import datetime
 import logging
+import random
 import sys
+import threading
+import time
 
-import docker
-
-from common import DockerAdapter, ServiceAdapter
+from common import CERT_RENEW_WINDOW, DockerAdapter, ServiceAdapter, docker_client
 from robocert import RoboCert
 
 logging.basicConfig()
@@ -19,13 +21,28 @@ class Robot:
     adapter: DockerAdapter
     cert: RoboCert
 
+    # Failed orders retry on a doubling backoff between these bounds rather
+    # than hammering the CA (and its failed-validation rate limits) or
+    # waiting for a renewal deadline that may be an hour away.
+    RETRY_DELAY_INITIAL = 30.0
+    DELAY_MAX = 3600.0
+
     def __init__(self) -> None:
-        self.adapter = DockerAdapter(docker.from_env())
-        self.cert = RoboCert()
+        self.adapter = DockerAdapter(docker_client())
+        self.cert = RoboCert(self.adapter)
+        self._order_sem = asyncio.Semaphore(
+            self.adapter.config.acme.max_concurrent_orders
+        )
+        self._dirty = asyncio.Event()
+        self._event_thread: Optional[threading.Thread] = None
+        self._retry_delay = self.RETRY_DELAY_INITIAL
 
     async def begin(self):
         await self.cert.begin()
 
+    def close(self) -> None:
+        self.cert.close()
+
     async def ensure_account(self) -> bool:
         if await self.cert.load_account():
             return True
@@ -33,6 +50,10 @@ class Robot:
             self.adapter.config.acme.email, self.adapter.config.acme.accept_tos
         )
 
+    async def order_cert(self, service: ServiceAdapter) -> bool:
+        async with self._order_sem:
+            return await self.cert.order_cert(service)
+
     @staticmethod
     def service_needs(service: ServiceAdapter) -> Optional[str]:
         if not service.latest_cert_pair:
@@ -41,40 +62,121 @@ class Robot:
             return "renew"
         return None
 
-    async def observe(self) -> None:
+    async def observe(self) -> int:
         logger.info("Observe")
-        services = [
-            sp
-            for sp in (
-                (service, self.service_needs(service))
-                for service in self.adapter.services
-                if service.acme_ssl
-            )
-            if sp[1] is not None
-        ]
+        # Plain loop, cheapest check first; the per-service label and cert
+        # lookups are memoized on the adapter instances.
+        services: List[Tuple[ServiceAdapter, str]] = []
+        for service in await self.adapter.aservices():
+            if not service.acme_ssl:
+                continue
+            need = self.service_needs(service)
+            if need is None:
+                continue
+            services.append((service, need))
 
         logger.info("Services requiring updates %r", services)
 
-        service_futs = [
-            asyncio.create_task(self.cert.order_cert(service[0]))
-            for service in services
-        ]
-
-        if service_futs:
-            await asyncio.wait(service_futs)
+        unsatisfied = 0
+        if services:
+            # gather schedules the coroutines itself; return_exceptions keeps
+            # one failed order from hiding the rest, and surfaces errors that
+            # asyncio.wait left unretrieved.
+            results = await asyncio.gather(
+                *(self.order_cert(service) for service, _ in services),
+                return_exceptions=True,
+            )
+            for (service, _), result in zip(services, results):
+                if isinstance(result, BaseException):
+                    logger.error(
+                        "Failed to order cert for %r", service, exc_info=result
+                    )
+                    unsatisfied += 1
+                elif not result:
+                    unsatisfied += 1
 
         logger.info("Observe done")
 
         # TODO: Clean up old keys and certs here
 
+        return unsatisfied
+
+    def _watch_events(self, loop: asyncio.AbstractEventLoop) -> None:
+        # docker-py's events stream is blocking; consume it in a daemon thread
+        # and poke the loop whenever a service or secret changes. The stream
+        # ends on daemon restarts and socket errors, so reconnect forever
+        # rather than silently degrading to the deadline poll.
+        while True:
+            try:
+                for _ in self.adapter.client.events(
+                    decode=True, filters=dict(type=["service", "secret"])
+                ):
+                    loop.call_soon_threadsafe(self._dirty.set)
+            except Exception:
+                logger.warning("Docker events stream failed, retrying", exc_info=True)
+            # An observe pass may have been missed while disconnected.
+            loop.call_soon_threadsafe(self._dirty.set)
+            time.sleep(5)
+
+    def _start_event_watcher(self) -> None:
+        if self._event_thread is not None and self._event_thread.is_alive():
+            return
+        self._event_thread = threading.Thread(
+            target=self._watch_events, args=(asyncio.get_running_loop(),), daemon=True
+        )
+        self._event_thread.start()
+
+    async def _next_wakeup_delay(self, unsatisfied: int) -> float:
+        # Sleep until the earliest cert enters its renewal window rather than
+        # waking on a fixed cadence; aservices() hits the adapter's listing
+        # cache straight after an observe pass.
+        if unsatisfied:
+            # A first issuance has no expiry to derive a deadline from, and a
+            # cert already inside its window yields one in the past; both
+            # retry on the backoff instead.
+            delay = self._retry_delay
+            self._retry_delay = min(self._retry_delay * 2, self.DELAY_MAX)
+            return delay + random.uniform(0, delay * 0.1)
+        self._retry_delay = self.RETRY_DELAY_INITIAL
+
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        deadline: Optional[datetime.datetime] = None
+        for service in await self.adapter.aservices():
+            if not service.acme_ssl:
+                continue
+            expiry = service.cert_expiry
+            if expiry is None:
+                continue
+            renew_at = expiry - CERT_RENEW_WINDOW
+            if deadline is None or renew_at < deadline:
+                deadline = renew_at
+
+        if deadline is None:
+            delay = self.DELAY_MAX
+        else:
+            delay = (deadline - now).total_seconds()
+        delay = max(1.0, min(delay, self.DELAY_MAX))
+        # Jitter desynchronizes replicas that booted at the same instant.
+        return delay + random.uniform(0, delay * 0.1)
+
     async def observe_and_obey(self) -> None:
         if not await self.cert.load_account():
             logger.critical("Could not load account")
             return
 
+        self._start_event_watcher()
+
         while True:
-            await self.observe()
-            await asyncio.sleep(10)
+            unsatisfied = await self.observe()
+            # Docker events cut the wait short; the deadline is the safety
+            # net for renewals when nothing in the swarm changes.
+            delay = await self._next_wakeup_delay(unsatisfied)
+            logger.debug("Next observe in %.1fs unless woken by an event", delay)
+            try:
+                await asyncio.wait_for(self._dirty.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty.clear()
 
 
 async def main_ensure_account(robot: Robot) -> int:
@@ -96,15 +198,26 @@ async def main(argv: List[str]) -> int:
     logger.info("Booting Nginx docker ingress robot")
     robot = Robot()
 
-    await robot.begin()
+    try:
+        await robot.begin()
 
-    if argv[0] == "ensure-account":
-        return await main_ensure_account(robot)
-    elif argv[0] == "observe-and-obey":
-        return await main_observe_and_obey(robot)
+        if argv[0] == "ensure-account":
+            return await main_ensure_account(robot)
+        elif argv[0] == "observe-and-obey":
+            return await main_observe_and_obey(robot)
 
-    return 1
+        return 1
+    finally:
+        robot.close()
 
 
 if __name__ == "__main__":
+    try:
+        # Optional: cuts event-loop overhead for the I/O-bound polling;
+        # everything runs the same on the stock loop if uvloop is absent.
+        import uvloop
+
+        uvloop.install()
+    except ImportError:
+        pass
     sys.exit(asyncio.run(main(sys.argv[1:])))